@@ -1,16 +1,17 @@
-from typing import Dict, Optional, List, Set
+from typing import Dict, Optional, List
 from fpdf import FPDF, XPos, YPos  # Ensure you are importing from fpdf2
-from bs4 import BeautifulSoup
 import logging
 from datetime import datetime
-import json
-import aiofiles
+import orjson
 import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
 from pathlib import Path
-from pdf_generator import PDFGenerator
+from pdf_generator import PDFGenerator, attach_fonts, render_pdf, start_pdf_pool
 from processing_result import ProcessingResult
 from config import Config
 from image_processor import ImageProcessor
+from cache_manager import CacheManager, ImageCache
 from blog_api import BlogAPI
 from my_secrets import Secrets
 from dataclasses import dataclass
@@ -23,9 +24,31 @@ class BatchProcessor:
         self.base_dir = Path(config.OUTPUT_DIR)
         self.errors_dir = self.base_dir / "errors"
         self.processed_file = self.base_dir / "processed_posts.json"
-        self.results_file = self.base_dir / "processing_results.json"
+        self.results_file = self.base_dir / "processing_results.jsonl"
+        self.results_export_file = self.base_dir / "processing_results.json"
         self.setup_directories()
         
+        # Bound how many posts are in flight and how fast requests hit the server
+        self._post_semaphore = asyncio.Semaphore(config.NUM_WORKERS)
+        self._rate_limiter = AsyncLimiter(config.RATE_LIMIT, 1)
+        self._save_lock = asyncio.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Caps image downloads across all posts, which are themselves processed concurrently
+        self._image_semaphore = asyncio.Semaphore(config.MAX_IMAGE_DOWNLOADS)
+        # Images repeated across posts (logos, headshots, banners) are only downloaded once
+        self.image_cache = ImageCache(self.base_dir / "image_cache")
+        # Emoji images are shared by every post's PDF generator
+        self.emoji_cache = CacheManager(Path(__file__).parent / "emoji_cache")
+        
+        # PDF rendering is CPU-bound, so it runs in worker processes rather than threads;
+        # their log records are forwarded to this process's handlers (and so to LOG_FILE)
+        self._pool, self._log_listener = start_pdf_pool(config.NUM_WORKERS)
+        
+        # Processed post IDs (mapped to their 'modified' timestamp) are kept in memory
+        # and flushed every FLUSH_INTERVAL updates
+        self._processed_posts: Optional[Dict[int, Optional[str]]] = None
+        self._unflushed = 0
+        
         # Define font attributes
         self.font_name = 'NotoSans'
         self.font_path = Path("/Users/aaron.lower/Desktop/code/wp2PDF/fonts")
@@ -47,7 +70,8 @@ class BatchProcessor:
     def register_fonts(self):
         """Register Noto Sans fonts with FPDF."""
         try:
-            self.pdf = FPDF()
+            # Prototype PDF that error PDFs are copied from, so the TTFs are parsed only once
+            self.pdf = FPDF(orientation='P', unit='mm', format='A4')
             self.pdf.add_font(self.font_name, '', str(self.font_path / 'NotoSans-Regular.ttf'), uni=True)
             self.pdf.add_font(self.font_name, 'B', str(self.font_path / 'NotoSans-Bold.ttf'), uni=True)
             self.pdf.add_font(self.font_name, 'I', str(self.font_path / 'NotoSans-Italic.ttf'), uni=True)
@@ -102,12 +126,8 @@ class BatchProcessor:
             
     def _create_base_pdf(self) -> FPDF:
         """Create a basic PDF with registered fonts and basic settings."""
-        pdf = FPDF(orientation='P', unit='mm', format='A4')
-        # Register fonts for this instance
-        pdf.add_font(self.font_name, '', str(self.font_path / 'NotoSans-Regular.ttf'), uni=True)
-        pdf.add_font(self.font_name, 'B', str(self.font_path / 'NotoSans-Bold.ttf'), uni=True)
-        pdf.add_font(self.font_name, 'I', str(self.font_path / 'NotoSans-Italic.ttf'), uni=True)
-        pdf.add_font(self.font_name, 'BI', str(self.font_path / 'NotoSans-BoldItalic.ttf'), uni=True)
+        # Clone the prototype's parsed fonts rather than re-adding them; each PDF gets its own font subsets
+        pdf = attach_fonts(FPDF(orientation='P', unit='mm', format='A4'), self.pdf.fonts)
         pdf.add_page()
         return pdf
         
@@ -118,117 +138,233 @@ class BatchProcessor:
 
     async def process_posts(self) -> None:
         """Main processing function with throttling and error handling."""
-        api = BlogAPI(Secrets.site_url, Secrets.username, Secrets.password)
+        # One connection pool shared by every image download in the run
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.config.NUM_WORKERS * 4, ttl_dns_cache=300)
+        )
         processed_posts = await self.load_processed_posts()
+        await self._migrate_results()
         page = 1
         per_page = self.config.BATCH_SIZE
         total_processed = 0
         retry_delay = self.config.RETRY_DELAY
+        next_page_task: Optional[asyncio.Task] = None
 
-        while True:
-            try:
-                logging.info(f"Fetching page {page}")
-                posts = await api.get_posts(page=page, per_page=per_page)
+        try:
+            async with BlogAPI(Secrets.site_url, Secrets.username, Secrets.password) as api:
+                while True:
+                    try:
+                        if next_page_task is None:
+                            logging.info(f"Fetching page {page}")
+                            posts = await self._fetch_page(api, page, per_page)
+                        else:
+                            # Page was prefetched while the previous one was processed
+                            posts = await next_page_task
+                            next_page_task = None
                 
-                if not posts:
-                    logging.info("No more posts to process")
-                    break
-
-                for post in posts:
-                    post_id = post.get('id')
-                    
-                    if post_id in processed_posts:
-                        logging.debug(f"Skipping already processed post {post_id}")
-                        continue
+                        if not posts:
+                            logging.info("No more posts to process")
+                            break
 
-                    try:
-                        # Create output directory using the post object instead of post_date
-                        output_dir = self.get_post_directory(post)
-                        
-                        logging.info(f"Processing post {post_id}")
-                        pdf_generator = PDFGenerator(output_dir)
-                        
-                        soup = BeautifulSoup(post['content']['rendered'], 'html.parser')
-                        image_urls = [img['src'] for img in soup.find_all('img')]
-                        images = await asyncio.gather(
-                            *[ImageProcessor.download_and_process_image(url) for url in image_urls]
-                        )
-                        
-                        pdf_path = await asyncio.to_thread(pdf_generator.create_pdf, post, images)
-                        
-                        result = ProcessingResult(
-                            post_id=post_id,
-                            title=post['title']['rendered'],
-                            date=post['date'],
-                            success=True,
-                            pdf_path=str(pdf_path)
+                        # Start fetching the next page so the API round-trip overlaps with PDF generation
+                        next_page_task = asyncio.create_task(self._fetch_page(api, page + 1, per_page))
+
+                        pending = []
+                        for post in posts:
+                            if self._is_up_to_date(post, processed_posts):
+                                logging.debug(f"Skipping already processed post {post.get('id')}")
+                                continue
+                            pending.append(post)
+
+                        outcomes = await asyncio.gather(
+                            *[self._process_one(post) for post in pending], return_exceptions=True
                         )
-                        
-                        await self.save_processed_post(post_id)
-                        
+                        for post, outcome in zip(pending, outcomes):
+                            if isinstance(outcome, Exception):
+                                logging.error(f"Unhandled error processing post {post.get('id')}: {outcome}")
+                        total_processed += len(pending)
+                
+                        page += 1
+                        logging.info(f"Moving to page {page}")
+                
                     except Exception as e:
-                        error_msg = str(e)
-                        logging.error(f"Error processing post {post_id}: {error_msg}")
-                        
-                        error_pdf = await self.create_error_pdf(post, error_msg)
-                        
-                        result = ProcessingResult(
-                            post_id=post_id,
-                            title=post['title']['rendered'],
-                            date=post['date'],
-                            success=False,
-                            error_message=error_msg,
-                            pdf_path=str(error_pdf) if error_pdf else None
-                        )
-                    
-                    await self.save_result(result)
-                    total_processed += 1
-                    await asyncio.sleep(1)
+                        # Drop any in-flight prefetch so the retry refetches the page directly
+                        if next_page_task is not None:
+                            next_page_task.cancel()
+                            next_page_task = None
+                        logging.error(f"Error processing page {page}: {e}")
+                        logging.info(f"Waiting {retry_delay} seconds before retry...")
+                        await asyncio.sleep(retry_delay)
+                        retry_delay = min(retry_delay * 2, self.config.MAX_RETRY_DELAY)
+                        continue
+
+                    if total_processed % 50 == 0:
+                        logging.info(f"Processed {total_processed} posts")
+        finally:
+            await self.flush()
+            await self.export_results()
+            await self.close()
+
+    async def close(self) -> None:
+        """Close the shared HTTP session and the PDF worker pool."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._pool.shutdown(wait=True)
+        self._log_listener.stop()
+
+    async def _fetch_page(self, api: BlogAPI, page: int, per_page: int) -> List[Dict]:
+        """Fetch a page of posts within the request rate limit."""
+        async with self._rate_limiter:
+            return await api.get_posts(page=page, per_page=per_page)
+
+    async def _process_one(self, post: Dict) -> None:
+        """Download images, render the PDF and record the result for a single post."""
+        post_id = post.get('id')
+        async with self._post_semaphore:
+            try:
+                # Create output directory using the post object instead of post_date
+                output_dir = self.get_post_directory(post)
+                
+                logging.info(f"Processing post {post_id}")
+                pdf_generator = PDFGenerator(output_dir, self.emoji_cache)
+                
+                image_urls = ImageProcessor.extract_image_urls(post['content']['rendered'])
+                images = await asyncio.gather(
+                    *[ImageProcessor.download_and_process_image(url, self._session, self._image_semaphore,
+                                                              self.image_cache, self._rate_limiter)
+                      for url in image_urls]
+                )
+                
+                # Fetch missing emoji images here, the render itself runs in a worker process
+                emojis = await asyncio.to_thread(pdf_generator.find_emojis, post)
+                if emojis:
+                    await self.emoji_cache.get_emoji_images(emojis, self._session)
                 
-                page += 1
-                logging.info(f"Moving to page {page}")
-                await asyncio.sleep(5)
+                loop = asyncio.get_running_loop()
+                pdf_path, data = await loop.run_in_executor(self._pool, render_pdf, output_dir, post, images,
+                                                            self.emoji_cache)
+                # Workers only render; writing here frees them for the next post sooner
+                await asyncio.to_thread(pdf_path.write_bytes, data)
+                logging.info(f"Successfully created PDF: {pdf_path.name}")
+                
+                result = ProcessingResult(
+                    post_id=post_id,
+                    title=post['title']['rendered'],
+                    date=post['date'],
+                    success=True,
+                    pdf_path=str(pdf_path)
+                )
+                
+                await self.save_processed_post(post_id, post.get('modified'))
                 
             except Exception as e:
-                logging.error(f"Error processing page {page}: {e}")
-                logging.info(f"Waiting {retry_delay} seconds before retry...")
-                await asyncio.sleep(retry_delay)
-                retry_delay = min(retry_delay * 2, self.config.MAX_RETRY_DELAY)
-                continue
+                error_msg = str(e)
+                logging.error(f"Error processing post {post_id}: {error_msg}")
+                
+                error_pdf = await self.create_error_pdf(post, error_msg)
+                
+                result = ProcessingResult(
+                    post_id=post_id,
+                    title=post['title']['rendered'],
+                    date=post['date'],
+                    success=False,
+                    error_message=error_msg,
+                    pdf_path=str(error_pdf) if error_pdf else None
+                )
+            
+            finally:
+                # Persist any emojis discovered for this post in a single write
+                await asyncio.to_thread(self.emoji_cache.flush)
+            
+            await self.save_result(result)
 
-            if total_processed % 50 == 0:
-                logging.info(f"Processed {total_processed} posts")
+    @staticmethod
+    def _is_up_to_date(post: Dict, processed_posts: Dict[int, Optional[str]]) -> bool:
+        """Check whether a post was processed and has not been modified since."""
+        post_id = post.get('id')
+        if post_id not in processed_posts:
+            return False
+        # Entries from older versions carry no timestamp and are treated as current
+        modified = processed_posts[post_id]
+        return modified is None or modified == post.get('modified')
 
-    async def load_processed_posts(self) -> Set[int]:
-        """Load the set of previously processed post IDs."""
-        try:
-            if self.processed_file.exists():
-                async with aiofiles.open(self.processed_file, 'r') as f:
-                    content = await f.read()
-                    return set(json.loads(content))
-            return set()
-        except Exception as e:
-            logging.error(f"Error loading processed posts: {e}")
-            return set()
+    async def load_processed_posts(self) -> Dict[int, Optional[str]]:
+        """Load previously processed post IDs and their modified timestamps (cached after the first call)."""
+        if self._processed_posts is None:
+            self._processed_posts = {}
+            try:
+                if self.processed_file.exists():
+                    content = await asyncio.to_thread(self.processed_file.read_bytes)
+                    data = orjson.loads(content)
+                    if isinstance(data, list):
+                        # Older versions stored a plain list of IDs
+                        self._processed_posts = dict.fromkeys(data)
+                    else:
+                        self._processed_posts = {int(post_id): modified for post_id, modified in data.items()}
+            except Exception as e:
+                logging.error(f"Error loading processed posts: {e}")
+        return self._processed_posts
 
-    async def save_processed_post(self, post_id: int) -> None:
-        """Save a post ID to the processed posts file."""
+    async def save_processed_post(self, post_id: int, modified: Optional[str] = None) -> None:
+        """Record a post as processed at its modified timestamp; written to disk on the next flush."""
         processed_posts = await self.load_processed_posts()
-        processed_posts.add(post_id)
-        async with aiofiles.open(self.processed_file, 'w') as f:
-            await f.write(json.dumps(list(processed_posts)))
+        processed_posts[post_id] = modified
+        await self._maybe_flush()
 
     async def save_result(self, result: ProcessingResult) -> None:
-        """Save processing result to the results file."""
+        """Append a processing result to the results file."""
         try:
-            results = []
-            if self.results_file.exists():
-                async with aiofiles.open(self.results_file, 'r') as f:
-                    content = await f.read()
-                    results = json.loads(content)
-            
-            results.append(result.__dict__)  # Convert dataclass to dictionary
-            async with aiofiles.open(self.results_file, 'w') as f:
-                await f.write(json.dumps(results, indent=2))
+            line = orjson.dumps(result)  # orjson serializes dataclasses natively
+            async with self._save_lock:
+                await asyncio.to_thread(self._append_line, self.results_file, line)
         except Exception as e:
-            logging.error(f"Error saving result: {e}")
\ No newline at end of file
+            logging.error(f"Error saving result: {e}")
+
+    @staticmethod
+    def _append_line(path: Path, line: bytes) -> None:
+        """Append a single line to a file."""
+        with open(path, 'ab') as f:
+            f.write(line + b'\n')
+
+    async def _migrate_results(self) -> None:
+        """Seed the JSONL results file from a results array written by older versions."""
+        if self.results_file.exists() or not self.results_export_file.exists():
+            return
+        try:
+            content = await asyncio.to_thread(self.results_export_file.read_bytes)
+            lines = b''.join(orjson.dumps(result) + b'\n' for result in orjson.loads(content))
+            await asyncio.to_thread(self.results_file.write_bytes, lines)
+        except Exception as e:
+            logging.error(f"Error migrating results: {e}")
+
+    async def export_results(self) -> None:
+        """Coalesce the JSONL results file into a single JSON array."""
+        try:
+            if not self.results_file.exists():
+                return
+            content = await asyncio.to_thread(self.results_file.read_bytes)
+            results = [orjson.loads(line) for line in content.splitlines() if line.strip()]
+            await asyncio.to_thread(self.results_export_file.write_bytes,
+                                    orjson.dumps(results, option=orjson.OPT_INDENT_2))
+        except Exception as e:
+            logging.error(f"Error exporting results: {e}")
+
+    async def _maybe_flush(self) -> None:
+        """Flush state to disk once enough updates have accumulated."""
+        self._unflushed += 1
+        if self._unflushed >= self.config.FLUSH_INTERVAL:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write processed post IDs to the processed posts file."""
+        async with self._save_lock:
+            if not self._unflushed:
+                return
+            self._unflushed = 0
+            try:
+                if self._processed_posts is not None:
+                    content = orjson.dumps(self._processed_posts, option=orjson.OPT_NON_STR_KEYS)
+                    await asyncio.to_thread(self.processed_file.write_bytes, content)
+            except Exception as e:
+                logging.error(f"Error saving processed posts: {e}")
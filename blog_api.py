@@ -1,7 +1,7 @@
 import logging
 import aiohttp
 from aiohttp import BasicAuth
-from typing import Dict, List
+from typing import Dict, List, Optional
 from tenacity import retry, stop_after_attempt, wait_exponential
 from config import Config
 
@@ -13,6 +13,18 @@ class BlogAPI:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json',
         }
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'BlogAPI':
+        """Open the HTTP session reused by every page request."""
+        self.session = aiohttp.ClientSession(auth=self.auth, headers=self.headers)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        """Close the HTTP session."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
     
     @retry(stop=stop_after_attempt(Config.MAX_RETRIES), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def get_posts(self, page: int = 1, per_page: int = 100) -> List[Dict]:
@@ -21,25 +33,27 @@ class BlogAPI:
         url = (f"{self.site_url}/wp-json/wp/v2/posts"  # Make sure to use the full API endpoint
                f"?page={page}&per_page={per_page}"
                f"&_embed=true"  # Request embedded data
-               f"&_fields=id,date,title,content,_embedded"  # Specify fields we want
+               f"&_fields=id,date,modified,title,content,_embedded"  # Specify fields we want
                f"&orderby=date&order=desc")  # Sort by date
         
         logging.debug(f"Fetching posts from URL: {url}")
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, auth=self.auth, ssl=False) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to fetch posts: {response.status}")
-                
-                posts = await response.json()
-                total_posts = response.headers.get('X-WP-Total', 'unknown')
-                total_pages = response.headers.get('X-WP-TotalPages', 'unknown')
-                
-                # Add debug logging for taxonomy data
-                if posts and isinstance(posts, list) and len(posts) > 0:
-                    sample_post = posts[0]
-                    logging.debug(f"Sample post embedded data: {sample_post.get('_embedded', {}).keys()}")
-                    logging.debug(f"Sample taxonomy data: {sample_post.get('_embedded', {}).get('wp:term', [])}")
-                
-                logging.info(f"Total posts: {total_posts}, Total pages: {total_pages}")
-                return posts
\ No newline at end of file
+        if self.session is None:
+            raise RuntimeError("BlogAPI must be used as an async context manager")
+        
+        async with self.session.get(url, ssl=False) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to fetch posts: {response.status}")
+            
+            posts = await response.json()
+            total_posts = response.headers.get('X-WP-Total', 'unknown')
+            total_pages = response.headers.get('X-WP-TotalPages', 'unknown')
+            
+            # Add debug logging for taxonomy data
+            if posts and isinstance(posts, list) and len(posts) > 0:
+                sample_post = posts[0]
+                logging.debug(f"Sample post embedded data: {sample_post.get('_embedded', {}).keys()}")
+                logging.debug(f"Sample taxonomy data: {sample_post.get('_embedded', {}).get('wp:term', [])}")
+            
+            logging.info(f"Total posts: {total_posts}, Total pages: {total_pages}")
+            return posts
\ No newline at end of file
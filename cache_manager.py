@@ -1,11 +1,18 @@
 from pathlib import Path
 import requests
+import asyncio
+import aiohttp
 import logging
 from PIL import Image
 from io import BytesIO
 import json
+import os
+import atexit
+import tempfile
 import hashlib
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
 
 class CacheManager:
     def __init__(self, cache_dir: Path):
@@ -13,10 +20,21 @@ class CacheManager:
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.emoji_mapping_file = self.cache_dir / "emoji_mapping.json"
         self.emoji_mapping = self._load_emoji_mapping()
+        # Mapping changes are kept in memory and written by flush()
+        self._dirty = False
+        atexit.register(self.flush)
+        # Emoji downloads in flight, shared by every post that needs the same emoji
+        self._emoji_downloads: Dict[str, asyncio.Task] = {}
         
         # Base URL for emoji images (using Twemoji as an example)
         self.emoji_base_url = "https://cdn.jsdelivr.net/gh/twitter/twemoji@latest/assets/72x72"
 
+    def __getstate__(self) -> dict:
+        """Leave the in-flight download tasks behind when sent to a PDF worker process."""
+        state = self.__dict__.copy()
+        state['_emoji_downloads'] = {}
+        return state
+
     def _load_emoji_mapping(self) -> dict:
         """Load emoji mapping from cache file."""
         if self.emoji_mapping_file.exists():
@@ -27,26 +45,43 @@ class CacheManager:
                 logging.error(f"Error loading emoji mapping: {str(e)}")
         return {}
 
-    def _save_emoji_mapping(self) -> None:
-        """Save emoji mapping to cache file."""
+    def _save_emoji_mapping(self, mapping: dict) -> None:
+        """Atomically save emoji mapping to cache file."""
         try:
-            with open(self.emoji_mapping_file, 'w', encoding='utf-8') as f:
-                json.dump(self.emoji_mapping, f, ensure_ascii=False, indent=2)
+            # Write to a temp file and rename, so concurrent flushes never leave a partial file
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.cache_dir,
+                                             suffix='.tmp', delete=False) as f:
+                json.dump(mapping, f, ensure_ascii=False, indent=2)
+            os.replace(f.name, self.emoji_mapping_file)
         except Exception as e:
             logging.error(f"Error saving emoji mapping: {str(e)}")
 
+    def flush(self) -> None:
+        """Write the emoji mapping to disk if it changed since the last flush."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        # Copy first: other tasks may add entries while the file is written
+        self._save_emoji_mapping(dict(self.emoji_mapping))
+
+    @staticmethod
+    def _get_code_points(emoji_char: str) -> str:
+        """Convert an emoji to its dash-separated hex code points, e.g. 1f44d-1f3fd."""
+        return '-'.join(f"{ord(char):x}" for char in emoji_char)
+
     def _get_emoji_filename(self, emoji_char: str) -> str:
         """Generate a filename for an emoji character."""
-        # Create a unique filename based on the emoji character
-        emoji_hash = hashlib.md5(emoji_char.encode('utf-8')).hexdigest()
-        return f"emoji_{emoji_hash}.png"
+        # Code points are already unique per emoji, so no hashing is needed
+        return f"emoji_{self._get_code_points(emoji_char)}.png"
+
+    def _get_emoji_url(self, emoji_char: str) -> str:
+        """Build the Twemoji URL for an emoji character."""
+        return f"{self.emoji_base_url}/{self._get_code_points(emoji_char)}.png"
 
     def _download_emoji_image(self, emoji_char: str) -> Optional[bytes]:
         """Download emoji image from Twemoji."""
         try:
-            # Convert emoji to code points
-            code_points = '-'.join(f"{ord(char):x}" for char in emoji_char)
-            url = f"{self.emoji_base_url}/{code_points}.png"
+            url = self._get_emoji_url(emoji_char)
             
             response = requests.get(url, timeout=10)
             response.raise_for_status()
@@ -55,6 +90,67 @@ class CacheManager:
             logging.error(f"Error downloading emoji image: {str(e)}")
             return None
 
+    async def _fetch_emoji_image(self, emoji_char: str, session: aiohttp.ClientSession) -> Optional[bytes]:
+        """Download emoji image from Twemoji using a shared session."""
+        try:
+            url = self._get_emoji_url(emoji_char)
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                return await response.read()
+        except Exception as e:
+            logging.error(f"Error downloading emoji image: {str(e)}")
+            return None
+
+    def _save_emoji_image(self, image_data: bytes, cache_path: Path) -> None:
+        """Convert downloaded emoji data to RGBA and atomically save it to the cache."""
+        img = Image.open(BytesIO(image_data))
+        img = img.convert('RGBA')
+        # Write to a temp file and rename, so PDF workers reading the emoji never see a partial file
+        with tempfile.NamedTemporaryFile('wb', dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            img.save(f, 'PNG')
+        os.replace(f.name, cache_path)
+
+    async def _cache_emoji_image(self, emoji_char: str,
+                                 session: aiohttp.ClientSession) -> Optional[Path]:
+        """Download and save one emoji unless its file is already cached."""
+        filename = self._get_emoji_filename(emoji_char)
+        cache_path = self.cache_dir / filename
+        if not cache_path.exists():
+            image_data = await self._fetch_emoji_image(emoji_char, session)
+            if not image_data:
+                return None
+            try:
+                await asyncio.to_thread(self._save_emoji_image, image_data, cache_path)
+            except Exception as e:
+                logging.error(f"Error processing emoji image: {str(e)}")
+                return None
+        self.emoji_mapping[emoji_char] = filename
+        self._dirty = True
+        return cache_path
+
+    async def get_emoji_images(self, emoji_chars: Iterable[str],
+                               session: aiohttp.ClientSession) -> Dict[str, Optional[Path]]:
+        """Make sure all given emojis are cached, downloading the missing ones concurrently."""
+        paths: Dict[str, Optional[Path]] = {}
+        pending: Dict[str, asyncio.Task] = {}
+        for emoji_char in set(emoji_chars):
+            if emoji_char in self.emoji_mapping:
+                paths[emoji_char] = self.cache_dir / self.emoji_mapping[emoji_char]
+                continue
+            # Posts are processed concurrently, so join a download another post already started
+            task = self._emoji_downloads.get(emoji_char)
+            if task is None:
+                task = asyncio.create_task(self._cache_emoji_image(emoji_char, session))
+                self._emoji_downloads[emoji_char] = task
+                task.add_done_callback(lambda _, c=emoji_char: self._emoji_downloads.pop(c, None))
+            pending[emoji_char] = task
+        
+        if pending:
+            # Shielded so a cancelled post does not cancel a download other posts are waiting on
+            results = await asyncio.gather(*[asyncio.shield(task) for task in pending.values()])
+            paths.update(zip(pending.keys(), results))
+        return paths
+
     def get_emoji_image(self, emoji_char: str) -> Optional[Path]:
         """Get emoji image from cache or download if necessary."""
         try:
@@ -67,25 +163,82 @@ class CacheManager:
                     # Download and save emoji image
                     image_data = self._download_emoji_image(emoji_char)
                     if image_data:
-                        # Process image before saving
-                        img = Image.open(BytesIO(image_data))
-                        img = img.convert('RGBA')
+                        # Process and save image
+                        self._save_emoji_image(image_data, cache_path)
                         
-                        # Save processed image
-                        img.save(cache_path, 'PNG')
-                        
-                        # Update mapping
-                        self.emoji_mapping[emoji_char] = str(filename)
-                        self._save_emoji_mapping()
                     else:
                         return None
                 
+                # Update mapping
                 self.emoji_mapping[emoji_char] = str(filename)
-                self._save_emoji_mapping()
+                self._dirty = True
             
             # Return path to cached image
             return self.cache_dir / self.emoji_mapping[emoji_char]
             
         except Exception as e:
             logging.error(f"Error processing emoji image: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+
+class ImageCache:
+    """Content-addressed cache of downloaded post images, keyed by URL."""
+
+    def __init__(self, cache_dir: Path, max_memory_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Bounded by size, not count: originals can be several MB each, and the
+        # disk cache (plus the OS page cache) already serves the rest
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    def _get_cache_path(self, url: str) -> Path:
+        """Generate the cache file path for an image URL."""
+        url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{url_hash}.img"
+
+    def _remember(self, url: str, data: bytes) -> None:
+        """Store an image in the in-memory LRU, evicting the oldest entries until it fits."""
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(url, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[url] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, url: str) -> Optional[bytes]:
+        """Return the cached image file for a URL, or None on a miss."""
+        with self._lock:
+            data = self._memory.get(url)
+            if data is not None:
+                self._memory.move_to_end(url)
+                return data
+        
+        cache_path = self._get_cache_path(url)
+        if not cache_path.exists():
+            return None
+        try:
+            data = cache_path.read_bytes()
+            self._remember(url, data)
+            return data
+        except Exception as e:
+            logging.error(f"Error reading cached image for {url}: {str(e)}")
+            return None
+
+    def put(self, url: str, data: bytes) -> None:
+        """Atomically save a downloaded image file to the cache."""
+        try:
+            # Write to a temp file and rename, so concurrent readers never see a partial file
+            with tempfile.NamedTemporaryFile('wb', dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+                f.write(data)
+            os.replace(f.name, self._get_cache_path(url))
+            self._remember(url, data)
+        except Exception as e:
+            logging.error(f"Error caching image for {url}: {str(e)}")
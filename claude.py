@@ -1,32 +1,54 @@
 from pathlib import Path
 from typing import Dict, Set, List, Optional
-from bs4 import BeautifulSoup
 import logging
 import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+import aiohttp
+try:
+    import uvloop
+except ImportError:  # uvloop does not support Windows
+    uvloop = None
 from pdf_generator import PDFGenerator
 from batch_processor import BatchProcessor
 from image_processor import ImageProcessor
 from config import Config
 
-async def process_batch(posts: List[Dict], output_dir: Path):
-    """Process a batch of posts asynchronously."""
+async def process_batch(posts: List[Dict], output_dir: Path, executor: Optional[Executor] = None):
+    """Process a batch of posts asynchronously (pass an executor to reuse PDF workers across batches)."""
     pdf_generator = PDFGenerator(output_dir)
+    semaphore = asyncio.Semaphore(Config.MAX_IMAGE_DOWNLOADS)
     
-    for post in posts:
-        try:
-            soup = BeautifulSoup(post['content']['rendered'], 'html.parser')
-            image_urls = [img['src'] for img in soup.find_all('img')]
-            
-            # Download images concurrently
-            images = await asyncio.gather(
-                *[ImageProcessor.download_and_process_image(url) for url in image_urls]
-            )
-            
-            await asyncio.to_thread(pdf_generator.create_pdf, post, images)
+    jobs = []
+    
+    async with aiohttp.ClientSession() as session:
+        for post in posts:
+            try:
+                image_urls = ImageProcessor.extract_image_urls(post['content']['rendered'])
+                
+                # Download images concurrently
+                images = await asyncio.gather(
+                    *[ImageProcessor.download_and_process_image(url, session, semaphore) for url in image_urls]
+                )
+                
+                emojis = await asyncio.to_thread(pdf_generator.find_emojis, post)
+                if emojis:
+                    await pdf_generator.cache_manager.get_emoji_images(emojis, session)
+                
+                jobs.append((post, images))
+                
+            except Exception as e:
+                logging.error(f"Failed to process post {post['id']}: {str(e)}")
+    
+    # Render the whole batch across all cores once its downloads are done
+    try:
+        pdf_paths = await pdf_generator.create_pdfs(jobs, executor=executor)
+    finally:
+        pdf_generator.close()
+    for (post, _), pdf_path in zip(jobs, pdf_paths):
+        if pdf_path is not None:
             logging.info(f"Successfully processed post {post['id']}")
-            
-        except Exception as e:
-            logging.error(f"Failed to process post {post['id']}: {str(e)}")
+    
+    pdf_generator.cache_manager.flush()
 
 async def main() -> None:
     """Main entry point for the script."""
@@ -39,8 +61,17 @@ async def main() -> None:
         ]
     )
     
+    # asyncio.to_thread work (image decoding, cache and state file I/O) runs on this pool
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=Config.NUM_WORKERS * 4, thread_name_prefix='wp2pdf')
+    )
+    
     processor = BatchProcessor(Config)
     await processor.process_posts()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -1,20 +1,61 @@
-from typing import Optional, Tuple
-from PIL import Image, ImageOps, UnidentifiedImageError
+from typing import List, Optional, Tuple
+from PIL import Image, UnidentifiedImageError
 from io import BytesIO
+from bs4 import BeautifulSoup, SoupStrainer
+import html
 import logging
+import asyncio
 import aiohttp
+from aiolimiter import AsyncLimiter
 from tenacity import retry, stop_after_attempt, wait_fixed
 import re
+from cache_manager import ImageCache
+
+# Matches the src attribute of an <img> tag (double-quoted, single-quoted or bare).
+# The attributes before it are skipped one name[=value] token at a time, so a quoted
+# value such as title="src=x.jpg" or alt="a > b" is never mistaken for the src.
+IMG_SRC_RE = re.compile(
+    r"""<img\b(?:\s+[^\s=>]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'>][^\s>]*))?)*?"""
+    r"""\s+src\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""",
+    re.IGNORECASE
+)
+
+# Counts <img tags in any case without making a lowercased copy of the post
+_IMG_TAG_RE = re.compile(r'<img', re.IGNORECASE)
+
+# Only <img> tags are built when the BeautifulSoup fallback parses a post
+_IMG_STRAINER = SoupStrainer('img')
+
+# Matches the size suffix WordPress adds to thumbnails, e.g. -150x150.jpg
+_THUMB_RE = re.compile(r'-\d+x\d+(\.[^.]+)$')
 
 class ImageProcessor:
+    @staticmethod
+    def extract_image_urls(html_content: str) -> List[str]:
+        """Return the unique image URLs of a post's HTML in document order."""
+        if _IMG_TAG_RE.search(html_content) is None:
+            # Text-only post, nothing to scan
+            return []
+        
+        img_count = sum(1 for _ in _IMG_TAG_RE.finditer(html_content))
+        matches = list(IMG_SRC_RE.finditer(html_content))
+        if len(matches) != img_count:
+            # Unusual markup (e.g. an <img> without src), let BeautifulSoup sort it out
+            soup = BeautifulSoup(html_content, 'html.parser', parse_only=_IMG_STRAINER)
+            urls = [img['src'] for img in soup.find_all('img') if img.get('src')]
+        else:
+            urls = [html.unescape(next(g for g in m.groups() if g is not None)) for m in matches]
+        return list(dict.fromkeys(urls))
+
     @staticmethod
     def _get_full_size_url(thumbnail_url: str) -> str:
         """Convert thumbnail URL to full-size image URL."""
         # Remove size suffix like -150x150 from the URL
-        return re.sub(r'-\d+x\d+(\.[^.]+)$', r'\1', thumbnail_url)
+        return _THUMB_RE.sub(r'\1', thumbnail_url)
 
     @staticmethod
-    async def _download_image(url: str, session: aiohttp.ClientSession) -> bytes:
+    async def _download_image(url: str, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                              limiter: Optional[AsyncLimiter] = None) -> bytes:
         """Download image with proper headers."""
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
@@ -23,39 +64,57 @@ class ImageProcessor:
             'Cache-Control': 'no-cache',
         }
         
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to download image: HTTP {response.status}")
-            return await response.read()
+        async with semaphore:
+            if limiter is not None:
+                await limiter.acquire()
+            async with session.get(url, headers=headers) as response:
+                if response.status != 200:
+                    raise Exception(f"Failed to download image: HTTP {response.status}")
+                # Stream into one buffer instead of collecting a list of chunks
+                buffer = BytesIO()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    buffer.write(chunk)
+                return buffer.getvalue()
+
+    @staticmethod
+    def _verify_image(image_data: bytes) -> None:
+        """Make sure downloaded data is an image PIL can read, without decoding its pixels."""
+        with Image.open(BytesIO(image_data)):
+            pass
 
     @staticmethod
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-    async def download_and_process_image(url: str) -> Optional[Image.Image]:
-        """Download and process image with improved error handling."""
+    async def download_and_process_image(url: str, session: aiohttp.ClientSession,
+                                         semaphore: asyncio.Semaphore,
+                                         cache: Optional[ImageCache] = None,
+                                         limiter: Optional[AsyncLimiter] = None) -> Optional[bytes]:
+        """Download an image file with improved error handling; decoding is left to the PDF renderer."""
         try:
+            if cache is not None:
+                cached = await asyncio.to_thread(cache.get, url)
+                if cached is not None:
+                    logging.debug(f"Using cached image for {url}")
+                    return cached
+            
             # Try to get full-size image URL
             full_url = ImageProcessor._get_full_size_url(url)
             logging.info(f"Attempting to download image from: {full_url}")
             
-            async with aiohttp.ClientSession() as session:
-                try:
-                    # Try full-size image first
-                    image_data = await ImageProcessor._download_image(full_url, session)
-                except Exception as e:
-                    logging.warning(f"Failed to download full-size image, trying original URL: {str(e)}")
-                    # Fall back to original URL if full-size fails
-                    image_data = await ImageProcessor._download_image(url, session)
+            try:
+                # Try full-size image first
+                image_data = await ImageProcessor._download_image(full_url, session, semaphore, limiter)
+            except Exception as e:
+                logging.warning(f"Failed to download full-size image, trying original URL: {str(e)}")
+                # Fall back to original URL if full-size fails
+                image_data = await ImageProcessor._download_image(url, session, semaphore, limiter)
 
-                img = Image.open(BytesIO(image_data))
-                img = ImageOps.exif_transpose(img)
-                
-                # Convert RGBA to RGB if necessary
-                if img.mode == 'RGBA':
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[3])
-                    img = background
-                
-                return img
+            # Reading the header is enough to reject error pages served with a 200
+            ImageProcessor._verify_image(image_data)
+            
+            if cache is not None:
+                await asyncio.to_thread(cache.put, url, image_data)
+            
+            return image_data
 
         except UnidentifiedImageError:
             logging.error(f"Unidentified image error for {url}")
@@ -1,18 +1,160 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from pathlib import Path
 from fpdf import FPDF
-from bs4 import BeautifulSoup
-from PIL import Image
+from fpdf.fonts import SubsetMap, TTFFont
+from fontTools import ttLib
+from selectolax.parser import HTMLParser
+from PIL import ExifTags, Image, ImageOps
+from io import BytesIO
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import multiprocessing
+import asyncio
 import warnings
+import threading
+import copy
 from datetime import datetime
 import re
 import html
+from functools import lru_cache
 import emoji
+from concurrent.futures import Executor, ProcessPoolExecutor
 from cache_manager import CacheManager
 
+# Marks the end of an emoji in the trie; no emoji contains the empty string as a character
+_TRIE_END = ''
+
+def _build_emoji_trie() -> dict:
+    """Build a character trie of all known emojis for single-pass matching."""
+    trie = {}
+    for em in emoji.EMOJI_DATA:
+        node = trie
+        for char in em:
+            node = node.setdefault(char, {})
+        node[_TRIE_END] = em
+    return trie
+
+_EMOJI_TRIE = _build_emoji_trie()
+
+# Cheap pre-filter for characters that may start an emoji: the exact Latin-1 starters
+# (#, *, digits, (c), (R)) plus anything above Latin-1, which the trie then checks.
+# A class listing every starter is far slower to scan than this coarse range.
+_EMOJI_FIRST_RE = re.compile(
+    '[' + ''.join(re.escape(char) for char in sorted(_EMOJI_TRIE) if ord(char) < 0x100) + '\u0100-\U0010ffff]'
+)
+
+def _match_emoji(text: str, start: int) -> Optional[str]:
+    """Return the longest emoji beginning at text[start], if any."""
+    node = _EMOJI_TRIE.get(text[start])
+    match = None
+    i = start
+    length = len(text)
+    while node is not None:
+        i += 1
+        match = node.get(_TRIE_END, match)
+        if i >= length:
+            break
+        node = node.get(text[i])
+    return match
+
+@lru_cache(maxsize=4096)
+def _split_text_and_emojis(text: str) -> Tuple[Tuple[bool, str], ...]:
+    """Split text into segments of regular text and emojis (memoized, so segments are tuples)."""
+    segments = []
+    text_start = 0  # Start of the plain text not yet emitted
+    
+    # Jump straight to characters that can start an emoji; everything between is plain text
+    candidate = _EMOJI_FIRST_RE.search(text)
+    while candidate is not None:
+        i = candidate.start()
+        match = _match_emoji(text, i)
+        if match:
+            # Found an emoji
+            if i > text_start:
+                segments.append((False, text[text_start:i]))
+            segments.append((True, match))
+            text_start = i + len(match)
+            candidate = _EMOJI_FIRST_RE.search(text, text_start)
+        else:
+            candidate = _EMOJI_FIRST_RE.search(text, i + 1)
+    
+    if text_start < len(text):
+        segments.append((False, text[text_start:]))
+    
+    return tuple(segments)
+
+# Fonts registered on a throwaway FPDF, parsed once per process and cloned for each PDF
+_FONTS_CACHE: Dict[Tuple, Dict[str, TTFFont]] = {}
+_FONTS_CACHE_LOCK = threading.Lock()
+
+def _clone_font(font: TTFFont, pdf: FPDF) -> TTFFont:
+    """Copy a parsed font for a new document, sharing its read-only width and glyph tables."""
+    # fpdf2 subsets the fontTools object and fills in the descriptor when writing,
+    # so those (and the used-glyph bookkeeping) must be per document
+    clone = copy.copy(font)
+    clone.ttfont = ttLib.TTFont(font.ttffile, recalcTimestamp=False, fontNumber=0, lazy=True)
+    clone.desc = copy.copy(font.desc)
+    clone.missing_glyphs = []
+    sbarr = "\x00 \r\n"
+    if pdf.str_alias_nb_pages:
+        sbarr += "0123456789" + pdf.str_alias_nb_pages
+    clone.subset = SubsetMap(clone, [ord(char) for char in sbarr])
+    return clone
+
+def attach_fonts(pdf: FPDF, fonts: Dict[str, TTFFont]) -> FPDF:
+    """Register clones of already parsed fonts (e.g. another FPDF's .fonts) on a fresh FPDF."""
+    pdf.fonts = {fontkey: _clone_font(font, pdf) for fontkey, font in fonts.items()}
+    return pdf
+
+def _init_pdf_worker(log_queue, level: int) -> None:
+    """Send a PDF worker's log records to the parent process, which writes them with its handlers."""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+def start_pdf_pool(max_workers: Optional[int] = None) -> Tuple[ProcessPoolExecutor, QueueListener]:
+    """Start a pool of PDF worker processes and the listener that logs their records here."""
+    # Workers are spawned, not forked: forking after the event loop's threads have started
+    # can copy a held lock (e.g. logging's) into the child and deadlock it
+    ctx = multiprocessing.get_context('spawn')
+    log_queue = ctx.Queue()
+    root = logging.getLogger()
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    listener.start()
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=_init_pdf_worker,
+                               initargs=(log_queue, root.getEffectiveLevel()))
+    return pool, listener
+
+class _SlugTable(dict):
+    """str.translate table for filenames, filled in as new characters are seen."""
+    def __missing__(self, code: int) -> Optional[str]:
+        char = chr(code)
+        if char == '-' or char.isspace():
+            value = '-'  # Separator, collapsed to a single underscore afterwards
+        elif char.isalnum() or char == '_':
+            value = char
+        else:
+            value = None  # Punctuation is dropped
+        self[code] = value
+        return value
+
+# Filename cleanup: one translate pass, then dash runs collapse to one underscore
+_SLUG_TABLE = _SlugTable()
+for _code in range(128):
+    _SLUG_TABLE.__missing__(_code)
+_FNAME_COLLAPSE = re.compile(r'-+')
+
+# Top-level tags rendered as their own paragraph
+_BLOCK_TAGS = frozenset(['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote'])
+
+# Resolution post images are embedded at
+_IMAGE_DPI = 150
+
+# EXIF orientations that rotate the image by 90 degrees, swapping width and height
+_ROTATED_ORIENTATIONS = frozenset([5, 6, 7, 8])
+
 class PDFGenerator:
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, cache_manager: Optional[CacheManager] = None):
         self.output_dir = output_dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.font_name = "NotoSans"
@@ -21,7 +163,7 @@ class PDFGenerator:
         # Setup emoji cache directory
         self.cache_dir = Path(__file__).parent / "emoji_cache"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.cache_manager = CacheManager(self.cache_dir)
+        self.cache_manager = cache_manager or CacheManager(self.cache_dir)
         
         # Configure logging
         logging.getLogger('fontTools.subset').setLevel(logging.WARNING)
@@ -33,6 +175,10 @@ class PDFGenerator:
             'B': str(self.font_dir / 'NotoSans-Bold.ttf'),
             'I': str(self.font_dir / 'NotoSans-Italic.ttf')
         }
+        
+        # Worker pool for create_pdfs, started on first use and kept until close()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._log_listener: Optional[QueueListener] = None
 
     def _write_text_with_emojis(self, pdf: FPDF, text: str, font_size: int = 12, style: str = '') -> None:
         """Write text to PDF with improved line spacing and emoji handling."""
@@ -43,71 +189,56 @@ class PDFGenerator:
         emoji_size = font_size * self.emoji_scale * (pdf.k / 72)
         line_height = font_size * 1.5  # Increased line height for better readability
         
-        segments = self._split_text_and_emojis(text)
-        x_start = pdf.l_margin  # Start from left margin
-        y_position = pdf.get_y()
-        current_x = x_start
-        line_width = 0
-        line_segments = []
-        
-        # First pass: calculate line breaks
-        for is_emoji, content in segments:
+        # Text flows through fpdf's own line breaking; emojis are placed inline between the runs
+        pdf.set_font(self.font_name, style, font_size)
+        pdf.set_x(pdf.l_margin)
+        for is_emoji, content in self._split_text_and_emojis(text):
             if is_emoji:
-                segment_width = emoji_size
+                self._write_emoji(pdf, content, emoji_size, line_height)
             else:
-                pdf.set_font(self.font_name, style, font_size)
-                segment_width = pdf.get_string_width(content)
-            
-            # Check if we need to start a new line
-            if current_x + segment_width > pdf.w - pdf.r_margin:
-                # Write the current line
-                self._write_line(pdf, line_segments, x_start, y_position, line_height, font_size, style)
-                # Reset for new line
-                y_position += line_height
-                current_x = x_start
-                line_segments = []
-                
-            line_segments.append((is_emoji, content))
-            current_x += segment_width
-        
-        # Write any remaining segments
-        if line_segments:
-            self._write_line(pdf, line_segments, x_start, y_position, line_height, font_size, style)
-            y_position += line_height
+                pdf.write(line_height, content)
         
-        # Update PDF position
-        pdf.set_y(y_position)
+        # Move below the last line
+        pdf.ln(line_height)
 
-    def _split_text_and_emojis(self, text: str) -> List[Tuple[bool, str]]:
+    def _write_emoji(self, pdf: FPDF, emoji_char: str, emoji_size: float, line_height: float) -> None:
+        """Place an emoji image at the current position, wrapping to the next line if it doesn't fit."""
+        try:
+            emoji_path = self.cache_manager.get_emoji_image(emoji_char)
+            if not emoji_path:
+                return
+            
+            if pdf.get_x() + emoji_size > pdf.w - pdf.r_margin:
+                pdf.ln(line_height)
+            if pdf.will_page_break(line_height):
+                pdf.add_page()
+            
+            x = pdf.get_x()
+            # A path lets fpdf2 load each emoji file once per document and reuse it by name
+            pdf.image(str(emoji_path), x=x, y=pdf.get_y() + (line_height - emoji_size)/2, h=emoji_size)
+            pdf.set_x(x + emoji_size)
+        except Exception as e:
+            logging.warning(f"Failed to add emoji image: {str(e)}")
+
+    def _split_text_and_emojis(self, text: str) -> Tuple[Tuple[bool, str], ...]:
         """Split text into segments of regular text and emojis."""
-        segments = []
-        current_text = ""
-        
-        i = 0
-        while i < len(text):
-            if any(text[i:].startswith(em) for em in emoji.EMOJI_DATA):
-                # Found an emoji
-                if current_text:
-                    segments.append((False, current_text))
-                    current_text = ""
-                
-                # Find the complete emoji
-                for em in emoji.EMOJI_DATA:
-                    if text[i:].startswith(em):
-                        segments.append((True, em))
-                        i += len(em)
-                        break
-            else:
-                current_text += text[i]
-                i += 1
-        
-        if current_text:
-            segments.append((False, current_text))
-        
-        return segments
+        return _split_text_and_emojis(text)
+
+    def find_emojis(self, post: Dict) -> Set[str]:
+        """Return the emojis that will be rendered as images for a post's content."""
+        content = html.unescape(post.get('content', {}).get('rendered', ''))
+        # Bypass the memo: whole posts are never split again and would only crowd it
+        return {content for is_emoji, content in _split_text_and_emojis.__wrapped__(content) if is_emoji}
 
-    def create_pdf(self, post: Dict, images: List[Optional[Image.Image]]) -> Path:
-        """Create a PDF from a blog post and its images."""
+    def create_pdf(self, post: Dict, images: List[Optional[bytes]]) -> Path:
+        """Create a PDF from a blog post and its encoded image files."""
+        pdf_path, data = self.build_pdf(post, images)
+        pdf_path.write_bytes(data)
+        logging.info(f"Successfully created PDF: {pdf_path.name}")
+        return pdf_path
+
+    def build_pdf(self, post: Dict, images: List[Optional[bytes]]) -> Tuple[Path, bytes]:
+        """Render a blog post to PDF bytes, returning them with the path they belong at."""
         try:
             pdf = self._create_pdf_instance()
             pdf.add_page()
@@ -167,44 +298,133 @@ class PDFGenerator:
                     first_paragraph = False
 
             # Handle images with improved spacing
-            for image in images:
-                if image:
+            for image_data in images:
+                if image_data:
                     try:
-                        pdf.add_page()
-                        available_height = pdf.h - pdf.t_margin - pdf.b_margin
-                        available_width = pdf.w - (2 * 20)  # 20px margin on each side
-                        
-                        # Calculate dimensions while maintaining aspect ratio
-                        img_width = available_width
-                        aspect = image.height / image.width
-                        img_height = img_width * aspect
-                        
-                        # Adjust if image is too tall
-                        if img_height > available_height:
-                            img_height = available_height
-                            img_width = img_height / aspect
-                        
-                        # Center the image horizontally
-                        x_pos = (pdf.w - img_width) / 2
-                        # Add some top margin
-                        y_pos = pdf.t_margin + 10
-                        
-                        pdf.image(image, x=x_pos, y=y_pos, w=img_width)
+                        # Only the header is read here, pixels are decoded once the printed size is known
+                        with Image.open(BytesIO(image_data)) as image:
+                            pdf.add_page()
+                            available_height = pdf.h - pdf.t_margin - pdf.b_margin
+                            available_width = pdf.w - (2 * 20)  # 20px margin on each side
+                            
+                            # Calculate dimensions while maintaining aspect ratio
+                            width, height = self._oriented_size(image)
+                            img_width = available_width
+                            aspect = height / width
+                            img_height = img_width * aspect
+                            
+                            # Adjust if image is too tall
+                            if img_height > available_height:
+                                img_height = available_height
+                                img_width = img_height / aspect
+                            
+                            # Center the image horizontally
+                            x_pos = (pdf.w - img_width) / 2
+                            # Add some top margin
+                            y_pos = pdf.t_margin + 10
+                            
+                            pdf.image(self._decode_image(image, img_width, img_height, pdf.k),
+                                      x=x_pos, y=y_pos, w=img_width)
                     except Exception as e:
                         logging.warning(f"Failed to add image to PDF: {str(e)}")
 
-            # Save PDF
-            filename = self._get_filename(post)
-            pdf_path = self.output_dir / filename
-            pdf.output(str(pdf_path))
-            
-            logging.info(f"Successfully created PDF: {filename}")
-            return pdf_path
+            # Serialize in memory, writing the file is left to the caller
+            pdf_path = self.output_dir / self._get_filename(post, cleaned_title=title)
+            return pdf_path, bytes(pdf.output())
 
         except Exception as e:
             logging.error(f"Failed to create PDF: {str(e)}")
             raise
 
+    @staticmethod
+    def _oriented_size(image: Image.Image) -> Tuple[int, int]:
+        """Return an opened image's size as displayed, i.e. after its EXIF orientation is applied."""
+        if image.getexif().get(ExifTags.Base.Orientation) in _ROTATED_ORIENTATIONS:
+            return image.height, image.width
+        return image.size
+
+    @staticmethod
+    def _decode_image(image: Image.Image, width: float, height: float, k: float) -> BytesIO:
+        """Decode an opened image at _IMAGE_DPI for its printed size and encode it as JPEG for fpdf2 to embed as is."""
+        # Sizes are in document units; k converts them to points (1/72 inch)
+        target = (max(1, int(width * k * _IMAGE_DPI / 72)), max(1, int(height * k * _IMAGE_DPI / 72)))
+        
+        # JPEGs are scaled down by libjpeg while decoding (draft is a no-op for other formats);
+        # draft works on the stored pixels, which lie sideways for rotated orientations
+        if image.getexif().get(ExifTags.Base.Orientation) in _ROTATED_ORIENTATIONS:
+            image.draft(None, target[::-1])
+        else:
+            image.draft(None, target)
+        image = ImageOps.exif_transpose(image)
+        
+        # Flatten transparency onto white; JPEG has no alpha, and convert('RGB') alone would turn it black
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[3])
+            image = background
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        
+        if image.width > target[0] or image.height > target[1]:
+            image.thumbnail(target, Image.LANCZOS)
+        
+        data = BytesIO()
+        image.save(data, 'JPEG', quality=85)
+        data.seek(0)
+        return data
+
+    def close(self) -> None:
+        """Shut down the worker pool started by create_pdfs, if any."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._log_listener.stop()
+            self._pool = None
+            self._log_listener = None
+
+    async def create_pdfs(self, posts_with_images: List[Tuple[Dict, List[Optional[bytes]]]],
+                          max_workers: Optional[int] = None,
+                          executor: Optional[Executor] = None) -> List[Optional[Path]]:
+        """Create PDFs for several posts in parallel worker processes (None for posts that failed)."""
+        # Workers keep their parsed fonts and caches, so reuse them: a caller's executor
+        # (e.g. from start_pdf_pool) or this generator's own pool, kept until close()
+        if executor is None:
+            if self._pool is None:
+                self._pool, self._log_listener = start_pdf_pool(max_workers)
+            executor = self._pool
+        
+        loop = asyncio.get_running_loop()
+        rendered = await asyncio.gather(
+            *[loop.run_in_executor(executor, render_pdf, self.output_dir, post, images, self.cache_manager)
+              for post, images in posts_with_images],
+            return_exceptions=True
+        )
+        
+        pending = []
+        for (post, _), result in zip(posts_with_images, rendered):
+            if isinstance(result, BaseException):
+                logging.error(f"Failed to create PDF for post {post.get('id')}: {str(result)}")
+            else:
+                pending.append(result)
+        
+        # Issue the whole batch of writes at once on the loop's default thread pool
+        written = set(await asyncio.gather(*[asyncio.to_thread(self._write_pdf, *item) for item in pending]))
+        return [
+            result[0] if not isinstance(result, BaseException) and result[0] in written else None
+            for result in rendered
+        ]
+
+    @staticmethod
+    def _write_pdf(pdf_path: Path, data: bytes) -> Optional[Path]:
+        """Write one rendered PDF to disk (None if the write failed)."""
+        try:
+            pdf_path.write_bytes(data)
+        except OSError as e:
+            logging.error(f"Failed to write PDF {pdf_path}: {str(e)}")
+            return None
+        logging.info(f"Successfully created PDF: {pdf_path.name}")
+        return pdf_path
+
     def _clean_html_text(self, html_text: str) -> str:
         """Clean HTML text and decode entities."""
         if not html_text:
@@ -212,8 +432,7 @@ class PDFGenerator:
         # First decode HTML entities
         text = html.unescape(html_text)
         # Then remove any remaining HTML tags
-        soup = BeautifulSoup(text, 'html.parser')
-        return soup.get_text()
+        return HTMLParser(text).text()
 
     def _format_date(self, date_str: str) -> str:
         """Format date string to YYYYMMDD @ HH:MM format."""
@@ -224,17 +443,18 @@ class PDFGenerator:
             logging.error(f"Error formatting date: {str(e)}")
             return date_str
 
-    def _get_filename(self, post: Dict) -> str:
-        """Generate filename in YYYYMMDD_title format."""
+    def _get_filename(self, post: Dict, cleaned_title: Optional[str] = None) -> str:
+        """Generate filename in YYYYMMDD_title format (pass cleaned_title to skip re-parsing the title)."""
         try:
             date_str = post.get('date', '')
             dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
             date_part = dt.strftime('%Y%m%d')
             
-            title = self._clean_html_text(post.get('title', {}).get('rendered', 'untitled'))
+            title = cleaned_title
+            if title is None:
+                title = self._clean_html_text(post.get('title', {}).get('rendered', 'untitled'))
             # Clean title for filename
-            title = re.sub(r'[^\w\s-]', '', title)
-            title = re.sub(r'[-\s]+', '_', title)
+            title = _FNAME_COLLAPSE.sub('_', title.translate(_SLUG_TABLE))
             title = title[:50].strip('_')
             
             return f"{date_part}_{title}.pdf"
@@ -287,19 +507,20 @@ class PDFGenerator:
             return ["No content available"]
             
         try:
-            # Parse HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
+            # Parse HTML. The tree is built the HTML5 way, unlike BeautifulSoup's html.parser:
+            # an unclosed <p> ends at the next block (<p>x<p>y gives two paragraphs, and
+            # <p>a<div>b</div>c</p> gives three), and comments are not emitted as text
+            tree = HTMLParser(html_content)
             
             # Remove script and style elements
-            for element in soup(['script', 'style']):
-                element.decompose()
+            tree.strip_tags(['script', 'style'])
             
             paragraphs = []
             current_text = []
             
             # Process elements in order they appear
-            for element in soup.children:
-                if element.name in ['p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote']:
+            for element in tree.body.iter(include_text=True):
+                if element.tag in _BLOCK_TAGS:
                     # If we have accumulated text, add it as a paragraph
                     if current_text:
                         combined_text = ' '.join(current_text).strip()
@@ -308,11 +529,11 @@ class PDFGenerator:
                         current_text = []
                     
                     # Process the block element
-                    text = element.get_text(strip=True)
+                    text = element.text(separator='', strip=True)
                     if text:
-                        paragraphs.append(html.unescape(text))
+                        paragraphs.append(text)
                 
-                elif element.name == 'br':
+                elif element.tag == 'br':
                     # Handle line breaks
                     if current_text:
                         combined_text = ' '.join(current_text).strip()
@@ -320,11 +541,11 @@ class PDFGenerator:
                             paragraphs.append(combined_text)
                         current_text = []
                 
-                elif isinstance(element, str):
+                elif element.tag == '-text':
                     # Handle text nodes
-                    text = element.strip()
+                    text = element.text_content.strip()
                     if text:
-                        current_text.append(html.unescape(text))
+                        current_text.append(text)
             
             # Add any remaining text
             if current_text:
@@ -335,8 +556,8 @@ class PDFGenerator:
             # Clean up paragraphs
             cleaned_paragraphs = []
             for para in paragraphs:
-                # Normalize whitespace
-                cleaned = ' '.join(para.split())
+                # Decode leftover (double-encoded) entities once per paragraph and normalize whitespace
+                cleaned = ' '.join(html.unescape(para).split())
                 if cleaned:
                     cleaned_paragraphs.append(cleaned)
             
@@ -348,30 +569,21 @@ class PDFGenerator:
             
     def _create_pdf_instance(self) -> FPDF:
         """Create a new PDF instance with registered fonts."""
-        with warnings.catch_warnings():
-            warnings.filterwarnings('ignore', category=UserWarning)
-            
-            pdf = FPDF()
-            for style, path in self.fonts.items():
-                pdf.add_font(family=self.font_name, style=style, fname=path, uni=True)
-            return pdf
-        
-    def _write_line(self, pdf: FPDF, segments: List[Tuple[bool, str]], x: float, y: float, line_height: float, font_size: int, style: str) -> None:
-        """Helper method to write a single line with mixed text and emojis."""
-        current_x = x
+        key = (self.font_name, tuple(sorted(self.fonts.items())))
+        with _FONTS_CACHE_LOCK:
+            fonts = _FONTS_CACHE.get(key)
+            if fonts is None:
+                with warnings.catch_warnings():
+                    warnings.filterwarnings('ignore', category=UserWarning)
+                    
+                    prototype = FPDF()
+                    for style, path in self.fonts.items():
+                        prototype.add_font(family=self.font_name, style=style, fname=path, uni=True)
+                fonts = _FONTS_CACHE[key] = prototype.fonts
         
-        for is_emoji, content in segments:
-            if is_emoji:
-                try:
-                    emoji_image = self.cache_manager.get_emoji_image(content)
-                    if emoji_image:
-                        emoji_size = font_size * self.emoji_scale * (pdf.k / 72)
-                        pdf.image(emoji_image, x=current_x, y=y + (line_height - emoji_size)/2, h=emoji_size)
-                        current_x += emoji_size
-                except Exception as e:
-                    logging.warning(f"Failed to add emoji image: {str(e)}")
-            else:
-                pdf.set_xy(current_x, y)
-                pdf.set_font(self.font_name, style, font_size)
-                pdf.write(line_height, content)
-                current_x = pdf.get_x()
\ No newline at end of file
+        return attach_fonts(FPDF(), fonts)
+
+def render_pdf(output_dir: Path, post: Dict, images: List[Optional[bytes]],
+               cache_manager: Optional[CacheManager] = None) -> Tuple[Path, bytes]:
+    """Render a post's PDF; a module-level function so process pools can pickle it by reference."""
+    return PDFGenerator(output_dir, cache_manager).build_pdf(post, images)
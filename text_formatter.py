@@ -4,6 +4,20 @@ import logging
 
 from dataclasses import dataclass
 
+class _PathTable(dict):
+    """str.translate table keeping alphanumerics and underscores, filled in as new characters are seen."""
+    def __missing__(self, code: int) -> Optional[str]:
+        char = chr(code)
+        value = char if char.isalnum() or char == '_' else None
+        self[code] = value
+        return value
+
+# Spaces become underscores; Latin-1 is precomputed, other characters are added on first use
+_PATH_TABLE = _PathTable({ord(' '): '_'})
+for _code in range(256):
+    if _code not in _PATH_TABLE:
+        _PATH_TABLE.__missing__(_code)
+
 class TextFormatter:
     @staticmethod
     def clean_for_path(text: str) -> str:
@@ -18,9 +32,8 @@ class TextFormatter:
             
             # Basic cleaning
             text = text.lower().strip()
-            text = text.replace(' ', '_')
-            # Allow only alphanumeric and underscore
-            text = ''.join(char for char in text if char.isalnum() or char == '_')
+            # Replace spaces and allow only alphanumeric and underscore
+            text = text.translate(_PATH_TABLE)
             # Limit length and remove trailing underscores
             text = text[:50].rstrip('_')
             return text or "untitled"